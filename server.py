@@ -5,13 +5,22 @@ Uses a hybrid approach: direct DB queries for read operations and API calls for
 import os
 import sys
 import asyncio
+import contextlib
+import hashlib
+import importlib.util
+import logging
+import re
+import time
 import uvicorn
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, List, Optional, Any, Tuple, Union
 from mcp.server.fastmcp import FastMCP, Context
 import httpx
-from pydantic import BaseModel, Field
-from motor.motor_asyncio import AsyncIOMotorClient
+import orjson
+from pydantic import BaseModel, ConfigDict, Field
+from pymongo import AsyncMongoClient
 from bson import ObjectId
 from dotenv import load_dotenv
 
@@ -25,63 +34,216 @@ mcp = FastMCP("Steve AI OS")
 DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
 STEVE_API_BASE_URL = os.environ.get("STEVE_API_BASE_URL")
 
+# Logging goes to stderr, since stdout carries the stdio transport
+logging.basicConfig(level=logging.DEBUG if DEBUG else logging.INFO, stream=sys.stderr)
+log = logging.getLogger("steve_mcp")
+log.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+
+# Authorization header used when the request has none (debug mode only)
+_FALLBACK_AUTH = f"Bearer {os.environ['STEVE_API_TOKEN']}" if DEBUG and os.environ.get("STEVE_API_TOKEN") else None
+
 # MongoDB connection
 MONGODB_URL = os.environ.get("MONGODB_URL")
 DATABASE_NAME = os.environ.get("DATABASE_NAME")
 
 # Initialize MongoDB client
 try:
-    mongodb_client = AsyncIOMotorClient(MONGODB_URL)
+    mongodb_client = AsyncMongoClient(MONGODB_URL, maxPoolSize=50, minPoolSize=5, serverSelectionTimeoutMS=2000)
     db = mongodb_client[DATABASE_NAME]
-    print(f"Connected to MongoDB at {MONGODB_URL}", file=sys.stderr)
+    log.info("Connected to MongoDB at %s", MONGODB_URL)
 except Exception as e:
-    print(f"Error connecting to MongoDB: {str(e)}", file=sys.stderr)
+    log.error("Error connecting to MongoDB: %s", e)
     db = None
 
+# Set once the indexes used by direct DB queries have been ensured
+_DB_INDEXES_READY = False
+
+# Shared HTTP client for the Steve API, reused across tool calls so connections are pooled
+HTTP_CLIENT: Optional[httpx.AsyncClient] = None
+
+# HTTP/2 needs the h2 package (httpx[http2]); fall back to HTTP/1.1 without it
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+
+# User profiles are cached per token, keyed by a hash of the Authorization header
+USER_CACHE_TTL = 300  # seconds
+USER_CACHE_MAX_SIZE = 1024
+_USER_CACHE: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+# Workspace product lists are cached briefly, keyed by workspace ID and source: "db" holds the
+# complete list from the DB, "api" the first page returned by /products/workspace
+PRODUCTS_CACHE_TTL = 60  # seconds
+_WS_PRODUCTS_CACHE: Dict[Tuple[str, str], Tuple[float, List[Dict[str, Any]]]] = {}
+
 # Helper functions
+def get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client for the Steve API, creating it on first use."""
+    global HTTP_CLIENT
+    if HTTP_CLIENT is None:
+        HTTP_CLIENT = httpx.AsyncClient(
+            base_url=STEVE_API_BASE_URL or "",
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30.0),
+            timeout=httpx.Timeout(10.0, connect=5.0),
+            http2=HTTP2_ENABLED
+        )
+    return HTTP_CLIENT
+
+async def close_http_client() -> None:
+    """Close the shared HTTP client and release its pooled connections."""
+    global HTTP_CLIENT
+    if HTTP_CLIENT is not None:
+        await HTTP_CLIENT.aclose()
+        HTTP_CLIENT = None
+
 def get_auth_header(context: Optional[Context] = None) -> Dict[str, str]:
     """Get the authorization header from context or environment variable."""
-    auth_header = None
-    
     # Try to get from context
-    if context and context.request_context and context.request_context.meta and hasattr(context.request_context.meta, "headers"):
-        auth_header = context.request_context.meta.headers.get("Authorization")
-    
+    if context is not None:
+        try:
+            auth_header = context.request_context.meta.headers.get("Authorization")
+            if auth_header:
+                return {"Authorization": auth_header}
+        except AttributeError:
+            pass
+
     # Fall back to environment variable in debug mode
-    if not auth_header and DEBUG and os.environ.get("STEVE_API_TOKEN"):
-        auth_header = f"Bearer {os.environ.get('STEVE_API_TOKEN')}"
-        
-    if not auth_header:
-        return {}
-        
-    return {"Authorization": auth_header}
+    return {"Authorization": _FALLBACK_AUTH} if _FALLBACK_AUTH else {}
+
+def _user_cache_key(auth_header: str) -> str:
+    """Get the user cache key for an Authorization header value."""
+    return hashlib.blake2b(auth_header.encode(), digest_size=16).hexdigest()
+
+def _cache_user(auth_header: str, user: Dict[str, Any]) -> None:
+    """Cache the user profile for an Authorization header value."""
+    key = _user_cache_key(auth_header)
+    _USER_CACHE[key] = (time.monotonic() + USER_CACHE_TTL, user)
+    _USER_CACHE.move_to_end(key)
+    while len(_USER_CACHE) > USER_CACHE_MAX_SIZE:
+        _USER_CACHE.popitem(last=False)
+
+def _invalidate_user(auth_header: Optional[str]) -> None:
+    """Drop the cached user profile for an Authorization header value."""
+    if auth_header:
+        _USER_CACHE.pop(_user_cache_key(auth_header), None)
 
 async def get_user_from_token(context: Optional[Context] = None) -> Optional[Dict[str, Any]]:
     """Get the user information from the authentication token."""
     auth_headers = get_auth_header(context)
     if not auth_headers:
         return None
-    
+
+    # Check the cache before hitting the API
+    auth_header = auth_headers["Authorization"]
+    key = _user_cache_key(auth_header)
+    entry = _USER_CACHE.get(key)
+    if entry is not None:
+        expires_at, user = entry
+        if expires_at >= time.monotonic():
+            _USER_CACHE.move_to_end(key)
+            return user
+        _USER_CACHE.pop(key, None)
+
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{STEVE_API_BASE_URL}/users/me",
-                headers=auth_headers
-            )
-            
-            if response.status_code != 200:
-                return None
-                
-            return response.json()
+        response = await get_http_client().get(
+            "/users/me",
+            headers=auth_headers
+        )
+
+        if response.status_code != 200:
+            return None
+
+        user = orjson.loads(response.content)
+        _cache_user(auth_header, user)
+        return user
     except Exception as e:
-        print(f"Error getting user from token: {str(e)}", file=sys.stderr)
+        log.warning("Error getting user from token: %s", e)
         return None
 
-async def format_task_for_display(task: Dict[str, Any]) -> str:
+def get_cached_products(workspace_id: str, source: str) -> Optional[List[Dict[str, Any]]]:
+    """Get the cached product list for a workspace from a source ("db" or "api"), if it has not expired."""
+    key = (workspace_id, source)
+    entry = _WS_PRODUCTS_CACHE.get(key)
+    if entry is None:
+        return None
+
+    expires_at, products = entry
+    if expires_at < time.monotonic():
+        _WS_PRODUCTS_CACHE.pop(key, None)
+        return None
+
+    return products
+
+def cache_products(workspace_id: str, source: str, products: List[Dict[str, Any]]) -> None:
+    """Cache the product list for a workspace from a source ("db" or "api")."""
+    _WS_PRODUCTS_CACHE[(workspace_id, source)] = (time.monotonic() + PRODUCTS_CACHE_TTL, products)
+
+def invalidate_workspace(workspace_id: str) -> None:
+    """Drop all cached product lists for a workspace."""
+    for source in ("db", "api"):
+        _WS_PRODUCTS_CACHE.pop((workspace_id, source), None)
+
+def format_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Format a product returned by the API for a tool response."""
+    return {
+        "id": product.get("id"),
+        "name": product.get("name"),
+        "description": product.get("description", ""),
+        "created_at": product.get("created_at", "")
+    }
+
+def format_datetime(value: Any) -> str:
+    """Format a datetime from the DB as ISO 8601, passing other values through as strings."""
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def find_product(products: List[Dict[str, Any]], product_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Find a product by name (case-insensitive), or the first product if no name is given."""
+    if not product_name:
+        return products[0]
+
+    product_name = product_name.lower()
+    for product in products:
+        if product["name"].lower() == product_name:
+            return product
+
+    return None
+
+@lru_cache(maxsize=1024)
+def _oid(value: str) -> ObjectId:
+    """Convert a string ID to an ObjectId, memoizing the parse for repeated IDs."""
+    return ObjectId(value)
+
+async def ensure_db_indexes() -> None:
+    """Create the indexes used by direct DB queries, once per process."""
+    global _DB_INDEXES_READY
+    if db is None or _DB_INDEXES_READY:
+        return
+
+    _DB_INDEXES_READY = True
+    try:
+        await db.products.create_index([("workspace_id", 1), ("name", 1)])
+    except Exception as e:
+        log.warning("Error creating DB indexes: %s", e)
+
+async def find_product_in_db(workspace_id: str, product_name: str) -> Optional[Dict[str, Any]]:
+    """Find a product in a workspace by name (case-insensitive) with a direct DB query."""
+    await ensure_db_indexes()
+    product = await db.products.find_one(
+        {
+            "workspace_id": _oid(workspace_id),
+            "name": {"$regex": f"^{re.escape(product_name)}$", "$options": "i"}
+        },
+        projection={"_id": 1, "name": 1}
+    )
+    if product is None:
+        return None
+
+    return {"id": str(product["_id"]), "name": product["name"]}
+
+def format_task_for_display(task: Dict[str, Any]) -> str:
     """Format a task for display in a text-based interface."""
     assigned_to = []
-    if isinstance(task.get("assigned_to"), list):
-        for user in task.get("assigned_to", []):
+    assignees = task.get("assigned_to")
+    if isinstance(assignees, list):
+        for user in assignees:
             if isinstance(user, dict):
                 assigned_to.append(user.get("full_name", user.get("email", "Unknown")))
             else:
@@ -108,15 +270,17 @@ async def format_task_for_display(task: Dict[str, Any]) -> str:
 # -------------------- TOOLS --------------------
 
 class TaskCreateInput(BaseModel):
+    model_config = ConfigDict(extra="forbid", validate_assignment=False, arbitrary_types_allowed=False)
+
     product_id: str
     parent_task_id: Optional[str] = None
     name: str
     description: Optional[str] = None
-    assigned_to: Optional[List[str]] = Field(default_factory=list)
+    assigned_to: List[str] = Field(default_factory=list)
     status: Optional[str] = "To do"  # To do, In progress, In review, Completed
     priority: Optional[str] = None
     type: Optional[str] = "active"  # "active" or "backlog"
-    tags: Optional[List[str]] = Field(default_factory=list)
+    tags: List[str] = Field(default_factory=list)
     is_simple_subtask: Optional[bool] = False
     start_date: Optional[datetime] = None
     due_date: Optional[datetime] = None
@@ -144,39 +308,39 @@ async def create_task(
                 "error": "Authentication required to create a task."
             }
         
-        # Convert task_input to dict for the API request
-        task_data = task_input.model_dump(exclude_none=True)
+        # Serialize task_input in a single pass for the API request
+        body = orjson.dumps(task_input.model_dump(mode="json", exclude_none=True))
         
         # Make the API request (always use API for write operations)
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{STEVE_API_BASE_URL}/tasks/",
-                headers=auth_headers,
-                json=task_data
-            )
-            
-            if response.status_code == 401:
-                return {
-                    "success": False,
-                    "error": "Authentication failed. Please check your token."
-                }
-                
-            if response.status_code != 201:
-                return {
-                    "success": False,
-                    "error": f"Error creating task: {response.text}"
-                }
-                
-            created_task = response.json()
-            
-            # Return success response
+        response = await get_http_client().post(
+            "/tasks/",
+            headers={**auth_headers, "Content-Type": "application/json"},
+            content=body
+        )
+
+        if response.status_code == 401:
+            _invalidate_user(auth_headers["Authorization"])
             return {
-                "success": True,
-                "task_id": created_task.get("id"),
-                "name": created_task.get("name"),
-                "status": created_task.get("status"),
-                "message": "Task created successfully"
+                "success": False,
+                "error": "Authentication failed. Please check your token."
             }
+
+        if response.status_code != 201:
+            return {
+                "success": False,
+                "error": f"Error creating task: {response.text}"
+            }
+
+        created_task = orjson.loads(response.content)
+
+        # Return success response
+        return {
+            "success": True,
+            "task_id": created_task.get("id"),
+            "name": created_task.get("name"),
+            "status": created_task.get("status"),
+            "message": "Task created successfully"
+        }
     except Exception as e:
         return {
             "success": False,
@@ -199,35 +363,36 @@ async def check_authentication(context: Context) -> Dict[str, Any]:
                 "error": "No authentication token found."
             }
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{STEVE_API_BASE_URL}/users/me",
-                headers=auth_headers
-            )
-            
-            if response.status_code == 401:
-                return {
-                    "success": False,
-                    "error": "Authentication failed. Your token may be expired."
-                }
-                
-            if response.status_code != 200:
-                return {
-                    "success": False,
-                    "error": f"Error checking authentication: {response.text}"
-                }
-                
-            user_data = response.json()
-            
+        response = await get_http_client().get(
+            "/users/me",
+            headers=auth_headers
+        )
+
+        if response.status_code == 401:
+            _invalidate_user(auth_headers["Authorization"])
             return {
-                "success": True,
-                "user": {
-                    "id": user_data.get("id"),
-                    "email": user_data.get("email"),
-                    "name": user_data.get("full_name"),
-                    "current_workspace": user_data.get("current_workspace")
-                }
+                "success": False,
+                "error": "Authentication failed. Your token may be expired."
             }
+
+        if response.status_code != 200:
+            return {
+                "success": False,
+                "error": f"Error checking authentication: {response.text}"
+            }
+
+        user_data = orjson.loads(response.content)
+        _cache_user(auth_headers["Authorization"], user_data)
+
+        return {
+            "success": True,
+            "user": {
+                "id": user_data.get("id"),
+                "email": user_data.get("email"),
+                "name": user_data.get("full_name"),
+                "current_workspace": user_data.get("current_workspace")
+            }
+        }
     except Exception as e:
         return {
             "success": False,
@@ -265,76 +430,93 @@ async def list_user_products(context: Context) -> Dict[str, Any]:
                 "error": "No current workspace found. Please select a workspace first."
             }
         
+        # Serve from the cached complete DB list when it is warm
+        products = get_cached_products(current_workspace_id, "db")
+        if products:
+            return {
+                "success": True,
+                "products": products
+            }
+
         # Print debug info
-        print(f"Fetching products for workspace ID: {current_workspace_id}", file=sys.stderr)
+        log.debug("Fetching products for workspace ID: %s", current_workspace_id)
         
         # If DB connection is available, use direct query
         if db is not None:
             try:
-                # Query products directly from DB
-                products_cursor = db.products.find({"workspace_id": ObjectId(current_workspace_id)})
+                # Query products directly from DB, fetching only the returned fields
+                products_cursor = db.products.find(
+                    {"workspace_id": _oid(current_workspace_id)},
+                    projection={"_id": 1, "name": 1, "description": 1, "created_at": 1}
+                ).limit(100)
                 products = await products_cursor.to_list(length=None)
                 
                 if products:
-                    print(f"Found {len(products)} products in DB", file=sys.stderr)
+                    log.debug("Found %d products in DB", len(products))
                 else:
-                    print("No products found in DB, falling back to API", file=sys.stderr)
+                    log.debug("No products found in DB, falling back to API")
                     raise Exception("No products found in DB")
                 
+                products = [
+                    {
+                        "id": str(product["_id"]),
+                        "name": product["name"],
+                        "description": product.get("description", ""),
+                        "created_at": format_datetime(product.get("created_at", ""))
+                    }
+                    for product in products
+                ]
+                cache_products(current_workspace_id, "db", products)
+
                 return {
                     "success": True,
-                    "products": [
-                        {
-                            "id": str(product["_id"]),
-                            "name": product["name"],
-                            "description": product.get("description", ""),
-                            "created_at": product["created_at"].isoformat() if isinstance(product.get("created_at"), datetime) else str(product.get("created_at", ""))
-                        }
-                        for product in products
-                    ]
+                    "products": products
                 }
             except Exception as e:
-                print(f"DB query failed, falling back to API: {str(e)}", file=sys.stderr)
+                log.warning("DB query failed, falling back to API: %s", e)
                 # Fall back to API if DB query fails
         
-        # Use API as fallback - use the correct endpoint format
-        print(f"Using API to fetch products for workspace {current_workspace_id}", file=sys.stderr)
-        async with httpx.AsyncClient() as client:
-            # Use the correct endpoint format
-            response = await client.get(
-                f"{STEVE_API_BASE_URL}/products/workspace",
-                headers=auth_headers,
-                params={"workspace_id": current_workspace_id, "limit": 10}
-            )
-            
-            if response.status_code == 401:
-                return {
-                    "success": False,
-                    "error": "Authentication failed. Please check your token."
-                }
-                
-            if response.status_code != 200:
-                print(f"API endpoint failed with status {response.status_code}, response: {response.text}", file=sys.stderr)
-                return {
-                    "success": False,
-                    "error": f"Error fetching products: {response.text}"
-                }
-                
-            products = response.json()
-            print(f"API returned {len(products)} products", file=sys.stderr)
-            
+        # The API fallback returns the same first page get_user_tasks caches
+        products = get_cached_products(current_workspace_id, "api")
+        if products:
             return {
                 "success": True,
-                "products": [
-                    {
-                        "id": product.get("id"),
-                        "name": product.get("name"),
-                        "description": product.get("description", ""),
-                        "created_at": product.get("created_at", "")
-                    }
-                    for product in products
-                ]
+                "products": products
+            }
+
+        # Use API as fallback - use the correct endpoint format
+        log.debug("Using API to fetch products for workspace %s", current_workspace_id)
+        # Use the correct endpoint format
+        response = await get_http_client().get(
+            "/products/workspace",
+            headers=auth_headers,
+            params={"workspace_id": current_workspace_id, "limit": 10}
+        )
+
+        if response.status_code == 401:
+            _invalidate_user(auth_headers["Authorization"])
+            return {
+                "success": False,
+                "error": "Authentication failed. Please check your token."
+            }
+
+        if response.status_code != 200:
+            log.warning("API endpoint failed with status %s, response: %s", response.status_code, response.text)
+            return {
+                "success": False,
+                "error": f"Error fetching products: {response.text}"
             }
+
+        products = [format_product(product) for product in orjson.loads(response.content)]
+        log.debug("API returned %d products", len(products))
+
+        if products:
+            cache_products(current_workspace_id, "api", products)
+
+        return {
+            "success": True,
+            "products": products
+        }
     except Exception as e:
         return {
             "success": False,
@@ -385,53 +567,66 @@ async def get_user_tasks(
         
         current_workspace_id = user.get("current_workspace")
         
-        # Step 1: Get products in the workspace
-        async with httpx.AsyncClient() as client:
-            product_response = await client.get(
-                f"{STEVE_API_BASE_URL}/products/workspace",
+        # Step 1: Look up a named product directly in the DB when it is available
+        product = None
+        if db is not None and product_name:
+            try:
+                product = await find_product_in_db(current_workspace_id, product_name)
+            except Exception as e:
+                log.warning("DB product lookup failed, falling back to API: %s", e)
+
+        # Step 2: Otherwise get products in the workspace, reusing the cached list when possible
+        if product is None:
+            products = get_cached_products(current_workspace_id, "api")
+            product = find_product(products, product_name) if products else None
+
+        if product is None:
+            # Cache miss, or the product may have been created since the list was cached
+            product_response = await get_http_client().get(
+                "/products/workspace",
                 headers=auth_headers,
                 params={"workspace_id": current_workspace_id, "limit": 10}
             )
-            
+
+            if product_response.status_code == 401:
+                _invalidate_user(auth_headers["Authorization"])
+                return {
+                    "success": False,
+                    "error": "Authentication failed. Please check your token."
+                }
+
             if product_response.status_code != 200:
                 return {
                     "success": False,
                     "error": f"Error fetching products: {product_response.text}"
                 }
-            
-            products = product_response.json()
-            
+
+            products = [format_product(p) for p in orjson.loads(product_response.content)]
+
             if not products:
                 return {
                     "success": False,
                     "error": "No products found in the current workspace."
                 }
+
+            cache_products(current_workspace_id, "api", products)
+            product = find_product(products, product_name)
+
+        # Step 3: Determine which product to use (the first product if none specified)
+        if product is None:
+            return {
+                "success": False,
+                "error": f"Product '{product_name}' not found. Available products: {', '.join([p['name'] for p in products])}"
+            }
+
+        product_id = product["id"]
+        product_name = product["name"]
         
-        # Step 2: Determine which product to use
-        product_id = None
-        if product_name:
-            # Find product by name
-            for product in products:
-                if product["name"].lower() == product_name.lower():
-                    product_id = product["id"]
-                    product_name = product["name"]
-                    break
-            
-            if not product_id:
-                return {
-                    "success": False,
-                    "error": f"Product '{product_name}' not found. Available products: {', '.join([p['name'] for p in products])}"
-                }
-        else:
-            # Use the first product if none specified
-            product_id = products[0]["id"]
-            product_name = products[0]["name"]
-        
-        # Step 3: Prepare parameters for task query
+        # Step 4: Prepare parameters for task query
         params = {
             "page": page,
             "limit": limit,
-            "product_id": product_id
+            "type": "active"
         }
         
         # Add filters if specified
@@ -442,34 +637,38 @@ async def get_user_tasks(
             params["priority"] = priority
         
         # Time frame filter
-        if time_frame == "upcoming":
-            params["due_after"] = datetime.now(timezone.utc).isoformat()
-        elif time_frame == "overdue":
-            params["due_before"] = datetime.now(timezone.utc).isoformat()
+        if time_frame in ("upcoming", "overdue"):
+            now_iso = datetime.now(timezone.utc).isoformat()
+            params["due_after" if time_frame == "upcoming" else "due_before"] = now_iso
         
-        # Step 4: Fetch tasks using the API
-        async with httpx.AsyncClient() as client:
-            task_response = await client.get(
-                f"{STEVE_API_BASE_URL}/tasks/product/{product_id}",
-                headers=auth_headers,
-                params={
-                    "limit": limit,
-                    "page": page,
-                    "type": "active"
-                }
-            )
-            
-            if task_response.status_code != 200:
-                return {
-                    "success": False,
-                    "error": f"Error fetching tasks: {task_response.text}"
-                }
-            
-            tasks = task_response.json()
+        # Step 5: Fetch tasks using the API
+        task_response = await get_http_client().get(
+            f"/tasks/product/{product_id}",
+            headers=auth_headers,
+            params=params
+        )
+
+        if task_response.status_code == 401:
+            _invalidate_user(auth_headers["Authorization"])
+            return {
+                "success": False,
+                "error": "Authentication failed. Please check your token."
+            }
+
+        if task_response.status_code != 200:
+            # The cached product may be stale (e.g. deleted), so refetch products next time
+            invalidate_workspace(current_workspace_id)
+            return {
+                "success": False,
+                "error": f"Error fetching tasks: {task_response.text}"
+            }
+
+        tasks = orjson.loads(task_response.content)
         
-        # Step 5: Format tasks for display
+        # Step 6: Format tasks for display
         formatted_tasks = []
         for task in tasks:
+            description = task.get("description") or ""
             formatted_task = {
                 "id": task.get("id"),
                 "name": task.get("name"),
@@ -477,7 +676,7 @@ async def get_user_tasks(
                 "priority": task.get("priority"),
                 "type": task.get("type"),
                 "due_date": task.get("due_date"),
-                "description": task.get("description", "")[:100] + "..." if task.get("description", "") and len(task.get("description", "")) > 100 else task.get("description", "")
+                "description": description[:100] + "..." if len(description) > 100 else description
             }
             formatted_tasks.append(formatted_task)
         
@@ -499,26 +698,30 @@ async def get_user_tasks(
 # Add a health check endpoint for Railway
 from starlette.responses import JSONResponse
 
-async def health_check(request):
-    """Health check endpoint for cloud providers."""
-    # Check MongoDB connection
-    mongodb_healthy = False
+async def _ping_mongo() -> bool:
+    """Check that MongoDB responds to a ping."""
     try:
-        if db:
+        if db is not None:
             # Simple ping to check connection
             await db.command("ping")
-            mongodb_healthy = True
+            return True
     except Exception as e:
-        print(f"MongoDB health check failed: {str(e)}", file=sys.stderr)
-    
-    # Check API connection
-    api_healthy = False
+        log.warning("MongoDB health check failed: %s", e)
+    return False
+
+async def _ping_api() -> bool:
+    """Check that the Steve API health endpoint responds with 200."""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"{STEVE_API_BASE_URL}/health")
-            api_healthy = response.status_code == 200
+        response = await get_http_client().get("/health")
+        return response.status_code == 200
     except Exception as e:
-        print(f"API health check failed: {str(e)}", file=sys.stderr)
+        log.warning("API health check failed: %s", e)
+    return False
+
+async def health_check(request):
+    """Health check endpoint for cloud providers."""
+    # Check MongoDB and API connections concurrently
+    mongodb_healthy, api_healthy = await asyncio.gather(_ping_mongo(), _ping_api())
     
     status = "healthy" if mongodb_healthy and api_healthy else "unhealthy"
     status_code = 200 if status == "healthy" else 503
@@ -533,41 +736,57 @@ async def health_check(request):
         status_code=status_code
     )
 
+# SSE app for cloud deployment, importable as "server:app"
+from mcp.server.sse import SseServerTransport
+from starlette.applications import Starlette
+from starlette.routing import Route
+
+# Create SSE transport
+sse = SseServerTransport("/messages/")
+
+# Define SSE handler
+async def handle_sse(request):
+    async with sse.connect_sse(
+        request.scope, request.receive, request._send
+    ) as streams:
+        await mcp.run(streams[0], streams[1])
+
+# Open the shared HTTP client and ensure DB indexes on startup, close the client on shutdown
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    get_http_client()
+    await ensure_db_indexes()
+    yield
+    await close_http_client()
+
+# Create Starlette app with health check endpoint
+starlette_app = Starlette(
+    debug=DEBUG,
+    lifespan=lifespan,
+    routes=[
+        Route("/health", endpoint=health_check),
+        Route("/sse", endpoint=handle_sse),
+    ],
+)
+
+# Dispatch MCP message POSTs straight to the SSE transport, bypassing Starlette's middleware and routing
+async def app(scope, receive, send):
+    if scope["type"] == "http" and scope["path"].startswith("/messages/"):
+        await sse.handle_post_message(scope, receive, send)
+    else:
+        await starlette_app(scope, receive, send)
+
 # Run the server if this file is executed directly
 if __name__ == "__main__":
     # When running for Claude Desktop, use stdio transport
     if os.environ.get("CLAUDE_DESKTOP_MCP", "0") == "1":
-        print("Starting Steve AI OS MCP server with stdio transport...", file=sys.stderr)
+        log.info("Starting Steve AI OS MCP server with stdio transport...")
         mcp.run(transport='stdio')
     else:
         # Use SSE transport for cloud deployment
-        from mcp.server.sse import SseServerTransport
-        from starlette.applications import Starlette
-        from starlette.routing import Mount, Route
-        
         # Railway sets PORT environment variable
         port = int(os.environ.get("PORT", 8000))
-        print(f"Starting Steve AI OS MCP server on port {port}...")
-        
-        # Create SSE transport
-        sse = SseServerTransport("/messages/")
-        
-        # Define SSE handler
-        async def handle_sse(request):
-            async with sse.connect_sse(
-                request.scope, request.receive, request._send
-            ) as streams:
-                await mcp.run(streams[0], streams[1])
-        
-        # Create Starlette app with health check endpoint
-        app = Starlette(
-            debug=DEBUG,
-            routes=[
-                Route("/health", endpoint=health_check),
-                Route("/sse", endpoint=handle_sse),
-                Mount("/messages/", app=sse.handle_post_message),
-            ],
-        )
+        log.info("Starting Steve AI OS MCP server on port %d...", port)
         
         # Print available resources and tools
         async def print_resources_and_tools():
@@ -581,5 +800,11 @@ if __name__ == "__main__":
             for tool in tools:
                 print(f"  - {tool}")
         
-        # Run the server
-        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+        # SSE sessions live in the memory of the process that opened them, and uvicorn workers
+        # share one socket, so a /messages/ POST could reach a worker without its session.
+        # Always run a single worker; scale out with separate processes instead.
+        if int(os.environ.get("WEB_CONCURRENCY", 1)) > 1:
+            log.warning("Ignoring WEB_CONCURRENCY: the SSE transport only supports a single worker per process")
+        
+        # Run the server (uvicorn uses uvloop and httptools when installed)
+        uvicorn.run(app, host="0.0.0.0", port=port)